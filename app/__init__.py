@@ -1,5 +1,6 @@
 from flask import Flask
 from flask_sqlalchemy import SQLAlchemy
+from flask_caching import Cache
 from flask_login import LoginManager
 from flask_wtf.csrf import CSRFProtect
 from getpass import getpass
@@ -11,6 +12,7 @@ login_manager = LoginManager()
 login_manager.login_view = 'auth.login'
 login_manager.login_message = 'Please log in to access this page.'
 csrf = CSRFProtect()
+cache = Cache()
 
 
 def create_app(config_class=Config):
@@ -20,6 +22,7 @@ def create_app(config_class=Config):
     db.init_app(app)
     login_manager.init_app(app)
     csrf.init_app(app)
+    cache.init_app(app)
 
     from app.routes.auth import auth_bp
     from app.routes.main import main_bp
@@ -29,8 +32,26 @@ def create_app(config_class=Config):
     app.register_blueprint(main_bp)
     app.register_blueprint(admin_bp, url_prefix='/admin')
 
-    with app.app_context():
+    # Deployed databases are created once with `flask init-db` instead of on every worker boot
+    if app.config.get('TESTING') or app.config.get('AUTO_CREATE_SCHEMA'):
+        from app.models import ArticleStats
+
+        with app.app_context():
+            db.create_all()
+            if ArticleStats.backfill():
+                db.session.commit()
+
+    @app.cli.command('init-db')
+    def init_db():
+        """Create any missing database tables."""
+        from app.models import ArticleStats
+
         db.create_all()
+        print('Database tables are in place.')
+
+        if ArticleStats.backfill():
+            db.session.commit()
+            print(f'Built statistics for {ArticleStats.query.count()} articles.')
 
     @app.cli.command('create-admin')
     def create_admin():
@@ -61,12 +82,62 @@ def create_app(config_class=Config):
 
         print(f'Admin user "{username}" created successfully!')
 
+    @app.cli.command('create-indexes')
+    def create_indexes():
+        """Create model indexes missing from an existing database."""
+        from sqlalchemy import text
+
+        engine = db.engine
+        is_postgres = engine.dialect.name == 'postgresql'
+        index_valid = text(
+            'SELECT i.indisvalid FROM pg_index i '
+            'JOIN pg_class c ON c.oid = i.indexrelid WHERE c.relname = :name'
+        )
+
+        with engine.connect().execution_options(isolation_level='AUTOCOMMIT') as conn:
+            for table in db.metadata.sorted_tables:
+                for index in table.indexes:
+                    if not is_postgres:
+                        index.create(conn, checkfirst=True)
+                        print(f'Index {index.name} on {table.name} is in place.')
+                        continue
+
+                    # Postgres builds the index without locking writes, which can't run in a
+                    # transaction. A failed concurrent build leaves an INVALID index behind,
+                    # so drop and rebuild those rather than treating them as present.
+                    valid = conn.execute(index_valid, {'name': index.name}).scalar()
+                    if valid is False:
+                        print(f'Index {index.name} on {table.name} is invalid, rebuilding.')
+                        conn.execute(text(f'DROP INDEX CONCURRENTLY {index.name}'))
+                    if valid is not True:
+                        unique = 'UNIQUE ' if index.unique else ''
+                        columns = ', '.join(column.name for column in index.columns)
+                        conn.execute(text(
+                            f'CREATE {unique}INDEX CONCURRENTLY {index.name} '
+                            f'ON {table.name} ({columns})'
+                        ))
+
+                    if conn.execute(index_valid, {'name': index.name}).scalar():
+                        print(f'Index {index.name} on {table.name} is in place.')
+                    else:
+                        print(f'Index {index.name} on {table.name} could not be built!')
+
+    @app.cli.command('refresh-article-stats')
+    def refresh_article_stats():
+        """Rebuild per-article annotation statistics from the annotations table."""
+        from app.models import ArticleStats
+
+        ArticleStats.refresh()
+        db.session.commit()
+        print(f'Refreshed statistics for {ArticleStats.query.count()} articles.')
+
     @app.cli.command('seed-articles')
     def seed_articles():
         """Seed the database with sample articles."""
         import json
         import os
         from app.models import Article
+        from app.articles import article_row, insert_articles
 
         # Check if articles already exist
         if Article.query.count() > 0:
@@ -84,15 +155,7 @@ def create_app(config_class=Config):
         with open(sample_path, 'r') as f:
             articles = json.load(f)
 
-        for a in articles:
-            article = Article(
-                title=a['title'],
-                source=a.get('source', ''),
-                url=a.get('url', ''),
-                full_text=a['full_text']
-            )
-            db.session.add(article)
-
+        insert_articles([article_row(a) for a in articles])
         db.session.commit()
         print(f'Successfully added {len(articles)} articles!')
 
@@ -0,0 +1,66 @@
+import re
+from datetime import date, datetime
+
+from sqlalchemy import insert
+
+from app import db
+from app.models import Article
+
+# Rows per multi-row INSERT when bulk-loading articles
+ARTICLE_BATCH_SIZE = 1000
+
+# Accepted publish_date formats, each behind a pattern so strptime only runs on likely matches
+ISO_DATE = re.compile(r'\d{4}-\d{2}-\d{2}', re.ASCII)
+DATE_FORMATS = [
+    (re.compile(r'\d{4}-\d{1,2}-\d{1,2}'), '%Y-%m-%d'),
+    (re.compile(r'\d{1,2}/\d{1,2}/\d{4}'), '%m/%d/%Y'),
+    (re.compile(r'\d{1,2}/\d{1,2}/\d{4}'), '%d/%m/%Y'),
+    # strptime treats each space in a format as one or more whitespace characters
+    (re.compile(r'[A-Za-z]+\s+\d{1,2},\s+\d{4}'), '%B %d, %Y'),
+]
+
+
+def article_row(data):
+    """Shape raw article data into a dict of Article column values."""
+    return {
+        'title': data['title'],
+        'source': data.get('source', ''),
+        'url': data.get('url', ''),
+        'publish_date': parse_date(data.get('publish_date')),
+        'full_text': data['full_text'],
+    }
+
+
+def insert_articles(rows):
+    """Insert article rows in batches of multi-row INSERTs as they arrive. Caller commits."""
+    added_count = 0
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) == ARTICLE_BATCH_SIZE:
+            db.session.execute(insert(Article), batch)
+            added_count += len(batch)
+            batch = []
+    if batch:
+        db.session.execute(insert(Article), batch)
+        added_count += len(batch)
+    return added_count
+
+
+def parse_date(date_str):
+    if not date_str:
+        return None
+    if ISO_DATE.fullmatch(date_str):
+        # Common case for uploads; fromisoformat is much cheaper than strptime
+        try:
+            return date.fromisoformat(date_str)
+        except ValueError:
+            return None
+    for pattern, fmt in DATE_FORMATS:
+        if not pattern.fullmatch(date_str):
+            continue
+        try:
+            return datetime.strptime(date_str, fmt).date()
+        except ValueError:
+            continue
+    return None
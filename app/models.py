@@ -1,6 +1,11 @@
 from datetime import datetime, date
-from werkzeug.security import generate_password_hash, check_password_hash
+from argon2 import PasswordHasher
+from argon2.exceptions import InvalidHashError, VerificationError
+from werkzeug.security import check_password_hash
+from flask import current_app
 from flask_login import UserMixin
+from sqlalchemy import delete, func, insert, inspect, select
+from sqlalchemy.dialects import postgresql, sqlite
 
 from app import db, login_manager
 
@@ -10,6 +15,20 @@ def load_user(id):
     return User.query.get(int(id))
 
 
+def dialect_insert(model):
+    """Build an INSERT supporting ON CONFLICT clauses for the session's database."""
+    if db.session.get_bind().dialect.name == 'postgresql':
+        return postgresql.insert(model)
+    return sqlite.insert(model)
+
+
+def password_hasher():
+    config = current_app.config
+    return PasswordHasher(time_cost=config['ARGON2_TIME_COST'],
+                          memory_cost=config['ARGON2_MEMORY_COST'],
+                          parallelism=config['ARGON2_PARALLELISM'])
+
+
 class User(UserMixin, db.Model):
     __tablename__ = 'users'
 
@@ -20,13 +39,31 @@ class User(UserMixin, db.Model):
     is_admin = db.Column(db.Boolean, default=False)
     date_joined = db.Column(db.DateTime, default=datetime.utcnow)
 
-    annotations = db.relationship('Annotation', backref='user', lazy='dynamic')
+    annotations = db.relationship('Annotation', backref='user', lazy='select')
 
     def set_password(self, password):
-        self.password_hash = generate_password_hash(password)
+        self.password_hash = password_hasher().hash(password)
 
     def check_password(self, password):
-        return check_password_hash(self.password_hash, password)
+        """Verify a password, rehashing it when the stored hash is outdated.
+
+        The caller is responsible for committing the upgraded hash.
+        """
+        if not self.password_hash.startswith('$argon2'):
+            # Legacy Werkzeug hash: upgrade to argon2 on successful login
+            if not check_password_hash(self.password_hash, password):
+                return False
+            self.set_password(password)
+            return True
+
+        hasher = password_hasher()
+        try:
+            hasher.verify(self.password_hash, password)
+        except (VerificationError, InvalidHashError):
+            return False
+        if hasher.check_needs_rehash(self.password_hash):
+            self.set_password(password)
+        return True
 
     def __repr__(self):
         return f'<User {self.username}>'
@@ -43,21 +80,30 @@ class Article(db.Model):
     full_text = db.Column(db.Text, nullable=False)
     date_added = db.Column(db.DateTime, default=datetime.utcnow)
 
-    annotations = db.relationship('Annotation', backref='article', lazy='dynamic')
+    annotations = db.relationship('Annotation', backref='article', lazy='select')
 
     def annotation_count(self):
-        return self.annotations.count()
+        if 'annotations' not in inspect(self).unloaded:
+            return len(self.annotations)
+        return db.session.query(func.count(Annotation.id))\
+            .filter(Annotation.article_id == self.id).scalar()
 
     def average_scores(self):
-        annotations = self.annotations.all()
-        if not annotations:
+        stats = db.session.query(
+            func.count(Annotation.id).label('count'),
+            func.avg(Annotation.mental_effort_score).label('mental_effort'),
+            func.avg(Annotation.background_knowledge_score).label('background_knowledge'),
+            func.avg(Annotation.emotional_drain_score).label('emotional_drain'),
+            func.avg(Annotation.clarity_score).label('clarity'),
+        ).filter(Annotation.article_id == self.id).one()
+        if not stats.count:
             return None
 
         return {
-            'mental_effort': sum(a.mental_effort_score for a in annotations) / len(annotations),
-            'background_knowledge': sum(a.background_knowledge_score for a in annotations) / len(annotations),
-            'emotional_drain': sum(a.emotional_drain_score for a in annotations) / len(annotations),
-            'clarity': sum(a.clarity_score for a in annotations) / len(annotations),
+            'mental_effort': float(stats.mental_effort),
+            'background_knowledge': float(stats.background_knowledge),
+            'emotional_drain': float(stats.emotional_drain),
+            'clarity': float(stats.clarity),
         }
 
     def __repr__(self):
@@ -87,13 +133,14 @@ class Annotation(db.Model):
     pause_count = db.Column(db.Integer)
     mouse_activity_score = db.Column(db.Float)
 
-    timestamp_submitted = db.Column(db.DateTime, default=datetime.utcnow)
+    timestamp_submitted = db.Column(db.DateTime, default=datetime.utcnow, index=True)
 
     difficult_passages = db.relationship('DifficultPassage', backref='annotation',
-                                         lazy='dynamic', cascade='all, delete-orphan')
+                                         lazy='select', cascade='all, delete-orphan')
 
     __table_args__ = (
         db.UniqueConstraint('article_id', 'user_id', name='unique_user_article_annotation'),
+        db.Index('ix_annotations_user_timestamp', 'user_id', 'timestamp_submitted'),
     )
 
     def __repr__(self):
@@ -104,10 +151,79 @@ class DifficultPassage(db.Model):
     __tablename__ = 'difficult_passages'
 
     id = db.Column(db.Integer, primary_key=True)
-    annotation_id = db.Column(db.Integer, db.ForeignKey('annotations.id'), nullable=False)
+    annotation_id = db.Column(db.Integer, db.ForeignKey('annotations.id'), nullable=False, index=True)
     text_content = db.Column(db.Text, nullable=False)
     start_offset = db.Column(db.Integer, nullable=False)
     end_offset = db.Column(db.Integer, nullable=False)
 
     def __repr__(self):
         return f'<DifficultPassage {self.text_content[:30]}>'
+
+
+class ArticleStats(db.Model):
+    """Per-article annotation count and running score averages.
+
+    Maintained on annotation submit so listings don't aggregate the
+    annotations table; articles without annotations have no row.
+    """
+    __tablename__ = 'article_stats'
+
+    article_id = db.Column(db.Integer, db.ForeignKey('articles.id'), primary_key=True)
+    annotation_count = db.Column(db.Integer, nullable=False, default=0)
+    avg_mental_effort = db.Column(db.Float)
+    avg_background_knowledge = db.Column(db.Float)
+    avg_emotional_drain = db.Column(db.Float)
+    avg_clarity = db.Column(db.Float)
+
+    SCORE_COLUMNS = {
+        'avg_mental_effort': 'mental_effort_score',
+        'avg_background_knowledge': 'background_knowledge_score',
+        'avg_emotional_drain': 'emotional_drain_score',
+        'avg_clarity': 'clarity_score',
+    }
+
+    @classmethod
+    def record_annotation(cls, article_id, scores):
+        """Fold one new annotation's scores into its article's stats. Caller commits."""
+        stmt = dialect_insert(cls).values(
+            article_id=article_id,
+            annotation_count=1,
+            **{avg: float(scores[score]) for avg, score in cls.SCORE_COLUMNS.items()}
+        )
+        # Incremental mean: avg += (new - avg) / (count + 1)
+        updates = {
+            avg: getattr(cls, avg)
+                 + (getattr(stmt.excluded, avg) - getattr(cls, avg)) / (cls.annotation_count + 1)
+            for avg in cls.SCORE_COLUMNS
+        }
+        updates['annotation_count'] = cls.annotation_count + 1
+        db.session.execute(stmt.on_conflict_do_update(index_elements=['article_id'], set_=updates))
+
+    @classmethod
+    def refresh(cls):
+        """Rebuild all stats from the annotations table. Caller commits."""
+        db.session.execute(delete(cls))
+        db.session.execute(insert(cls).from_select(
+            ['article_id', 'annotation_count', *cls.SCORE_COLUMNS],
+            select(
+                Annotation.article_id,
+                func.count(Annotation.id),
+                *(func.avg(getattr(Annotation, score)) for score in cls.SCORE_COLUMNS.values())
+            ).group_by(Annotation.article_id)
+        ))
+
+    @classmethod
+    def backfill(cls):
+        """Build stats if the table is empty but annotations exist. Caller commits.
+
+        Covers databases that predate the table. Returns whether stats were built.
+        """
+        if db.session.query(select(cls.article_id).exists()).scalar():
+            return False
+        if not db.session.query(select(Annotation.id).exists()).scalar():
+            return False
+        cls.refresh()
+        return True
+
+    def __repr__(self):
+        return f'<ArticleStats article={self.article_id} count={self.annotation_count}>'
@@ -1,15 +1,18 @@
 import csv
-import json
-from io import StringIO
-from datetime import datetime
+from io import TextIOWrapper
 from functools import wraps
 
-from flask import Blueprint, render_template, redirect, url_for, flash, request, Response
+import orjson
+from flask import Blueprint, render_template, redirect, url_for, flash, request, Response, \
+    stream_with_context
 from flask_login import login_required, current_user
 from sqlalchemy import func
+from sqlalchemy.orm import joinedload, load_only, selectinload
 
 from app import db
-from app.models import Article, Annotation, User, DifficultPassage
+from app.articles import article_row, insert_articles
+from app.models import Article, Annotation, ArticleStats, User, DifficultPassage
+from app.stats import annotations_by_day, clear_dashboard_cache, dashboard_stats
 
 admin_bp = Blueprint('admin', __name__)
 
@@ -28,42 +31,18 @@ def admin_required(f):
 @admin_bp.route('/')
 @admin_required
 def dashboard():
-    # Get statistics
-    total_articles = Article.query.count()
-    total_annotations = Annotation.query.count()
-    total_users = User.query.filter_by(is_admin=False).count()
-
-    # Articles needing more annotations (< 5 ratings)
-    articles_needing_ratings = db.session.query(
-        Article.id, Article.title, func.count(Annotation.id).label('count')
-    ).outerjoin(Annotation).group_by(Article.id)\
-        .having(func.count(Annotation.id) < 5).count()
+    stats = dashboard_stats()
 
     # Average scores across all annotations
-    avg_scores = None
-    if total_annotations > 0:
-        avg_scores = db.session.query(
-            func.avg(Annotation.mental_effort_score).label('mental_effort'),
-            func.avg(Annotation.background_knowledge_score).label('background_knowledge'),
-            func.avg(Annotation.emotional_drain_score).label('emotional_drain'),
-            func.avg(Annotation.clarity_score).label('clarity'),
-        ).first()
-
-    # Annotations per day (last 30 days)
-    annotations_by_day = db.session.query(
-        func.date(Annotation.timestamp_submitted).label('date'),
-        func.count(Annotation.id).label('count')
-    ).group_by(func.date(Annotation.timestamp_submitted))\
-        .order_by(func.date(Annotation.timestamp_submitted).desc())\
-        .limit(30).all()
+    avg_scores = stats if stats['total_annotations'] > 0 else None
 
     return render_template('admin/dashboard.html',
-                           total_articles=total_articles,
-                           total_annotations=total_annotations,
-                           total_users=total_users,
-                           articles_needing_ratings=articles_needing_ratings,
+                           total_articles=stats['total_articles'],
+                           total_annotations=stats['total_annotations'],
+                           total_users=stats['total_users'],
+                           articles_needing_ratings=stats['articles_needing_ratings'],
                            avg_scores=avg_scores,
-                           annotations_by_day=annotations_by_day)
+                           annotations_by_day=annotations_by_day())
 
 
 @admin_bp.route('/upload', methods=['GET', 'POST'])
@@ -76,30 +55,20 @@ def upload():
             return redirect(url_for('admin.upload'))
 
         filename = file.filename.lower()
-        content = file.read().decode('utf-8')
 
         try:
             if filename.endswith('.json'):
-                articles = parse_json_articles(content)
+                articles = parse_json_articles(file.read())
             elif filename.endswith('.csv'):
-                articles = parse_csv_articles(content)
+                # Decode and parse rows lazily so they're inserted as they are read
+                articles = parse_csv_articles(TextIOWrapper(file.stream, encoding='utf-8', newline=''))
             else:
                 flash('Unsupported file format. Please upload JSON or CSV.', 'error')
                 return redirect(url_for('admin.upload'))
 
-            added_count = 0
-            for article_data in articles:
-                article = Article(
-                    title=article_data['title'],
-                    source=article_data.get('source', ''),
-                    url=article_data.get('url', ''),
-                    publish_date=parse_date(article_data.get('publish_date')),
-                    full_text=article_data['full_text']
-                )
-                db.session.add(article)
-                added_count += 1
-
+            added_count = insert_articles(articles)
             db.session.commit()
+            clear_dashboard_cache()
             flash(f'Successfully added {added_count} articles.', 'success')
 
         except Exception as e:
@@ -112,48 +81,37 @@ def upload():
 
 
 def parse_json_articles(content):
-    data = json.loads(content)
-    if isinstance(data, list):
-        return data
-    elif isinstance(data, dict) and 'articles' in data:
-        return data['articles']
-    else:
+    data = orjson.loads(content)
+    if isinstance(data, dict) and 'articles' in data:
+        data = data['articles']
+    elif not isinstance(data, list):
         raise ValueError('JSON must be an array or object with "articles" key')
+    return [article_row(a) for a in data]
 
 
-def parse_csv_articles(content):
-    articles = []
-    reader = csv.DictReader(StringIO(content))
-    for row in reader:
-        articles.append({
+def parse_csv_articles(stream):
+    """Yield article rows from a text stream of CSV data."""
+    for row in csv.DictReader(stream):
+        yield article_row({
             'title': row.get('title', ''),
             'source': row.get('source', ''),
             'url': row.get('url', ''),
             'publish_date': row.get('publish_date', ''),
             'full_text': row.get('full_text', '')
         })
-    return articles
-
-
-def parse_date(date_str):
-    if not date_str:
-        return None
-    for fmt in ['%Y-%m-%d', '%m/%d/%Y', '%d/%m/%Y', '%B %d, %Y']:
-        try:
-            return datetime.strptime(date_str, fmt).date()
-        except ValueError:
-            continue
-    return None
 
 
 @admin_bp.route('/articles')
 @admin_required
 def articles_list():
+    # Only the listed columns; full_text can be large and isn't shown
+    annotation_count = func.coalesce(ArticleStats.annotation_count, 0)
     articles = db.session.query(
         Article,
-        func.count(Annotation.id).label('annotation_count')
-    ).outerjoin(Annotation).group_by(Article.id)\
-        .order_by(func.count(Annotation.id).asc()).all()
+        annotation_count.label('annotation_count')
+    ).options(load_only(Article.id, Article.title, Article.source, Article.publish_date))\
+        .outerjoin(ArticleStats)\
+        .order_by(annotation_count.asc()).all()
 
     return render_template('admin/articles.html', articles=articles)
 
@@ -161,8 +119,12 @@ def articles_list():
 @admin_bp.route('/article/<int:article_id>/annotations')
 @admin_required
 def article_annotations(article_id):
-    article = Article.query.get_or_404(article_id)
+    article = Article.query.options(
+        load_only(Article.title, Article.source, Article.publish_date)
+    ).get_or_404(article_id)
     annotations = Annotation.query.filter_by(article_id=article_id)\
+        .options(joinedload(Annotation.user).load_only(User.username),
+                 selectinload(Annotation.difficult_passages))\
         .order_by(Annotation.timestamp_submitted.desc()).all()
 
     return render_template('admin/annotations.html',
@@ -170,42 +132,52 @@ def article_annotations(article_id):
                            annotations=annotations)
 
 
+class Echo:
+    """File-like object whose write() hands the line back, for streaming csv.writer output."""
+
+    def write(self, value):
+        return value
+
+
 @admin_bp.route('/export')
 @admin_required
 def export_csv():
-    output = StringIO()
-    writer = csv.writer(output)
-
-    # Header row
-    writer.writerow([
-        'annotation_id', 'article_id', 'article_title', 'user_id', 'username',
-        'mental_effort_score', 'background_knowledge_score', 'emotional_drain_score',
-        'clarity_score', 'optional_comments', 'time_spent_seconds', 'active_time_seconds',
-        'scroll_depth_percent', 'scroll_back_count', 'pause_count', 'mouse_activity_score',
-        'timestamp_submitted', 'difficult_passages'
-    ])
-
-    # Data rows
-    annotations = Annotation.query.all()
-    for a in annotations:
-        # Get difficult passages as JSON string
-        passages = [{'text': p.text_content, 'start': p.start_offset, 'end': p.end_offset}
-                    for p in a.difficult_passages]
-        passages_json = json.dumps(passages) if passages else ''
-
-        writer.writerow([
-            a.id, a.article_id, a.article.title, a.user_id, a.user.username,
-            a.mental_effort_score, a.background_knowledge_score, a.emotional_drain_score,
-            a.clarity_score, a.optional_comments or '', a.time_spent_seconds,
-            a.active_time_seconds, a.scroll_depth_percent, a.scroll_back_count,
-            a.pause_count, a.mouse_activity_score,
-            a.timestamp_submitted.isoformat() if a.timestamp_submitted else '',
-            passages_json
+    def generate():
+        writer = csv.writer(Echo())
+
+        # Header row
+        yield writer.writerow([
+            'annotation_id', 'article_id', 'article_title', 'user_id', 'username',
+            'mental_effort_score', 'background_knowledge_score', 'emotional_drain_score',
+            'clarity_score', 'optional_comments', 'time_spent_seconds', 'active_time_seconds',
+            'scroll_depth_percent', 'scroll_back_count', 'pause_count', 'mouse_activity_score',
+            'timestamp_submitted', 'difficult_passages'
         ])
 
-    output.seek(0)
+        # Data rows, fetched in chunks with related rows loaded per chunk
+        annotations = Annotation.query.options(
+            joinedload(Annotation.article).load_only(Article.title),
+            joinedload(Annotation.user).load_only(User.username),
+            selectinload(Annotation.difficult_passages),
+        ).order_by(Annotation.id).yield_per(1000)
+        for a in annotations:
+            # Get difficult passages as JSON string
+            passages = [{'text': p.text_content, 'start': p.start_offset, 'end': p.end_offset}
+                        for p in a.difficult_passages]
+            passages_json = orjson.dumps(passages).decode() if passages else ''
+
+            yield writer.writerow([
+                a.id, a.article_id, a.article.title, a.user_id, a.user.username,
+                a.mental_effort_score, a.background_knowledge_score, a.emotional_drain_score,
+                a.clarity_score, a.optional_comments or '', a.time_spent_seconds,
+                a.active_time_seconds, a.scroll_depth_percent, a.scroll_back_count,
+                a.pause_count, a.mouse_activity_score,
+                a.timestamp_submitted.isoformat() if a.timestamp_submitted else '',
+                passages_json
+            ])
+
     return Response(
-        output.getvalue(),
+        stream_with_context(generate()),
         mimetype='text/csv',
         headers={'Content-Disposition': 'attachment; filename=annotations_export.csv'}
     )
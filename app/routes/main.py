@@ -1,9 +1,11 @@
 from flask import Blueprint, render_template, redirect, url_for, flash, request, jsonify
 from flask_login import login_required, current_user
-from sqlalchemy import func
+from sqlalchemy import func, insert, select
+from sqlalchemy.orm import joinedload, load_only
 
 from app import db
-from app.models import Article, Annotation, DifficultPassage
+from app.models import Article, Annotation, ArticleStats, DifficultPassage, dialect_insert
+from app.stats import clear_dashboard_cache
 
 main_bp = Blueprint('main', __name__)
 
@@ -18,27 +20,33 @@ def index():
 @main_bp.route('/dashboard')
 @login_required
 def dashboard():
-    # Get user's annotation statistics
-    user_annotations = Annotation.query.filter_by(user_id=current_user.id).all()
-    total_annotations = len(user_annotations)
+    # Get user's annotation count and average scores in one query
+    stats = db.session.query(
+        func.count(Annotation.id).label('count'),
+        func.avg(Annotation.mental_effort_score).label('mental_effort'),
+        func.avg(Annotation.background_knowledge_score).label('background_knowledge'),
+        func.avg(Annotation.emotional_drain_score).label('emotional_drain'),
+        func.avg(Annotation.clarity_score).label('clarity'),
+    ).filter(Annotation.user_id == current_user.id).one()
+    total_annotations = stats.count
 
     # Calculate average scores given by user
     avg_scores = None
     if total_annotations > 0:
         avg_scores = {
-            'mental_effort': sum(a.mental_effort_score for a in user_annotations) / total_annotations,
-            'background_knowledge': sum(a.background_knowledge_score for a in user_annotations) / total_annotations,
-            'emotional_drain': sum(a.emotional_drain_score for a in user_annotations) / total_annotations,
-            'clarity': sum(a.clarity_score for a in user_annotations) / total_annotations,
+            'mental_effort': float(stats.mental_effort),
+            'background_knowledge': float(stats.background_knowledge),
+            'emotional_drain': float(stats.emotional_drain),
+            'clarity': float(stats.clarity),
         }
 
     # Get total articles and articles needing ratings
-    total_articles = Article.query.count()
-    articles_rated_by_user = Annotation.query.filter_by(user_id=current_user.id).count()
-    articles_remaining = total_articles - articles_rated_by_user
+    total_articles = db.session.query(func.count(Article.id)).scalar()
+    articles_remaining = total_articles - total_annotations
 
     # Recent annotations
     recent_annotations = Annotation.query.filter_by(user_id=current_user.id)\
+        .options(joinedload(Annotation.article).load_only(Article.title))\
         .order_by(Annotation.timestamp_submitted.desc())\
         .limit(5).all()
 
@@ -55,19 +63,13 @@ def dashboard():
 def next_article():
     """Get the next article for annotation using priority algorithm."""
     # Find articles user hasn't rated, prioritizing those with fewer ratings
-    subquery = db.session.query(
-        Article.id,
-        func.count(Annotation.id).label('annotation_count')
-    ).outerjoin(Annotation).group_by(Article.id).subquery()
-
-    # Get articles user hasn't annotated
-    user_annotated = db.session.query(Annotation.article_id)\
-        .filter(Annotation.user_id == current_user.id).subquery()
-
-    article = db.session.query(Article)\
-        .join(subquery, Article.id == subquery.c.id)\
-        .filter(~Article.id.in_(user_annotated))\
-        .order_by(subquery.c.annotation_count.asc(), func.random())\
+    user_annotated = select(Annotation.article_id)\
+        .where(Annotation.user_id == current_user.id)
+
+    article = db.session.query(Article.id)\
+        .outerjoin(ArticleStats)\
+        .filter(Article.id.not_in(user_annotated))\
+        .order_by(func.coalesce(ArticleStats.annotation_count, 0).asc(), func.random())\
         .first()
 
     if not article:
@@ -98,27 +100,23 @@ def view_article(article_id):
 @main_bp.route('/article/<int:article_id>/submit', methods=['POST'])
 @login_required
 def submit_annotation(article_id):
-    article = Article.query.get_or_404(article_id)
-
-    # Check for existing annotation
-    existing = Annotation.query.filter_by(
-        article_id=article_id,
-        user_id=current_user.id
-    ).first()
-
-    if existing:
-        return jsonify({'error': 'You have already rated this article'}), 400
+    Article.query.options(load_only(Article.id)).get_or_404(article_id)
 
     try:
         data = request.get_json()
+        scores = {
+            'mental_effort_score': int(data['mental_effort_score']),
+            'background_knowledge_score': int(data['background_knowledge_score']),
+            'emotional_drain_score': int(data['emotional_drain_score']),
+            'clarity_score': int(data['clarity_score']),
+        }
 
-        annotation = Annotation(
+        # Insert the annotation unless the user already rated this article;
+        # the unique constraint detects duplicates without a separate SELECT
+        stmt = dialect_insert(Annotation).values(
             article_id=article_id,
             user_id=current_user.id,
-            mental_effort_score=int(data['mental_effort_score']),
-            background_knowledge_score=int(data['background_knowledge_score']),
-            emotional_drain_score=int(data['emotional_drain_score']),
-            clarity_score=int(data['clarity_score']),
+            **scores,
             optional_comments=data.get('optional_comments', ''),
             time_spent_seconds=float(data.get('time_spent_seconds', 0)),
             active_time_seconds=float(data.get('active_time_seconds', 0)),
@@ -126,23 +124,29 @@ def submit_annotation(article_id):
             scroll_back_count=int(data.get('scroll_back_count', 0)),
             pause_count=int(data.get('pause_count', 0)),
             mouse_activity_score=float(data.get('mouse_activity_score', 0)),
-        )
-
-        db.session.add(annotation)
-        db.session.flush()  # Get annotation ID
-
-        # Add difficult passages if any
-        difficult_passages = data.get('difficult_passages', [])
-        for passage in difficult_passages:
-            dp = DifficultPassage(
-                annotation_id=annotation.id,
-                text_content=passage['text_content'],
-                start_offset=int(passage['start_offset']),
-                end_offset=int(passage['end_offset'])
-            )
-            db.session.add(dp)
+        ).on_conflict_do_nothing(
+            index_elements=['article_id', 'user_id']
+        ).returning(Annotation.id)
+
+        annotation_id = db.session.execute(stmt).scalar()
+        if annotation_id is None:
+            db.session.rollback()
+            return jsonify({'error': 'You have already rated this article'}), 400
+
+        ArticleStats.record_annotation(article_id, scores)
+
+        # Add difficult passages if any, in a single INSERT
+        difficult_passages = [{
+            'annotation_id': annotation_id,
+            'text_content': passage['text_content'],
+            'start_offset': int(passage['start_offset']),
+            'end_offset': int(passage['end_offset'])
+        } for passage in data.get('difficult_passages', [])]
+        if difficult_passages:
+            db.session.execute(insert(DifficultPassage), difficult_passages)
 
         db.session.commit()
+        clear_dashboard_cache()
 
         return jsonify({'success': True, 'redirect': url_for('main.dashboard')})
 
@@ -0,0 +1,46 @@
+from datetime import datetime, time, timedelta
+
+from sqlalchemy import func, select
+
+from app import cache, db
+from app.models import Article, Annotation, ArticleStats, User
+
+
+@cache.memoize()
+def dashboard_stats():
+    # All scalar statistics in one round-trip: annotation aggregates plus
+    # uncorrelated subqueries for the other tables
+    return db.session.query(
+        select(func.count(Article.id)).correlate(None)
+            .scalar_subquery().label('total_articles'),
+        func.count(Annotation.id).label('total_annotations'),
+        select(func.count(User.id)).where(User.is_admin.is_(False)).correlate(None)
+            .scalar_subquery().label('total_users'),
+        # Articles needing more annotations (< 5 ratings)
+        select(func.count(Article.id)).outerjoin(ArticleStats)
+            .where(func.coalesce(ArticleStats.annotation_count, 0) < 5).correlate(None)
+            .scalar_subquery().label('articles_needing_ratings'),
+        func.avg(Annotation.mental_effort_score).label('mental_effort'),
+        func.avg(Annotation.background_knowledge_score).label('background_knowledge'),
+        func.avg(Annotation.emotional_drain_score).label('emotional_drain'),
+        func.avg(Annotation.clarity_score).label('clarity'),
+    ).select_from(Annotation).one()._asdict()
+
+
+@cache.memoize()
+def annotations_by_day():
+    # Annotations per day (last 30 days, including today)
+    cutoff = datetime.combine(datetime.utcnow().date() - timedelta(days=29), time.min)
+    rows = db.session.query(
+        func.date(Annotation.timestamp_submitted).label('date'),
+        func.count(Annotation.id).label('count')
+    ).filter(Annotation.timestamp_submitted >= cutoff)\
+        .group_by(func.date(Annotation.timestamp_submitted))\
+        .order_by(func.date(Annotation.timestamp_submitted).desc()).all()
+    return [row._asdict() for row in rows]
+
+
+def clear_dashboard_cache():
+    """Drop cached dashboard aggregates after annotations or articles change."""
+    cache.delete_memoized(dashboard_stats)
+    cache.delete_memoized(annotations_by_day)
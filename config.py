@@ -13,8 +13,36 @@ def get_database_url():
         return url
     return 'sqlite:///cognitive_load.db'
 
+def get_engine_options(url):
+    """Get SQLAlchemy engine options, sizing the connection pool for server databases."""
+    options = {'insertmanyvalues_page_size': 1000}
+    if not url.startswith('sqlite'):
+        options.update({
+            'pool_size': int(os.environ.get('DB_POOL_SIZE', 20)),
+            'max_overflow': int(os.environ.get('DB_MAX_OVERFLOW', 10)),
+            'pool_pre_ping': True,
+            'pool_recycle': 1800,
+            'pool_use_lifo': True,
+        })
+    return options
+
 class Config:
     SECRET_KEY = os.environ.get('SECRET_KEY') or 'dev-secret-key-change-in-production'
     SQLALCHEMY_DATABASE_URI = get_database_url()
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+    SQLALCHEMY_ENGINE_OPTIONS = get_engine_options(SQLALCHEMY_DATABASE_URI)
+    # Create tables at startup; on by default only for the local SQLite database
+    AUTO_CREATE_SCHEMA = os.environ.get(
+        'AUTO_CREATE_SCHEMA', str(SQLALCHEMY_DATABASE_URI.startswith('sqlite'))
+    ).lower() in ('1', 'true', 'yes')
     WTF_CSRF_ENABLED = True
+
+    # Short-lived cache for admin dashboard aggregates; use RedisCache with several workers
+    CACHE_TYPE = os.environ.get('CACHE_TYPE', 'SimpleCache')
+    CACHE_DEFAULT_TIMEOUT = int(os.environ.get('CACHE_DEFAULT_TIMEOUT', 60))
+    CACHE_REDIS_URL = os.environ.get('REDIS_URL')
+
+    # Argon2 password hashing cost (memory cost is in KiB)
+    ARGON2_TIME_COST = int(os.environ.get('ARGON2_TIME_COST', 2))
+    ARGON2_MEMORY_COST = int(os.environ.get('ARGON2_MEMORY_COST', 64 * 1024))
+    ARGON2_PARALLELISM = int(os.environ.get('ARGON2_PARALLELISM', 1))